@@ -1,14 +1,29 @@
 from fastapi import FastAPI, Body, HTTPException, Request, Response
-from fastapi.responses import JSONResponse, PlainTextResponse, HTMLResponse
+from fastapi.responses import JSONResponse, HTMLResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
-from typing import Dict, Any, Optional
+from fastapi.concurrency import run_in_threadpool
+from typing import Dict, Any, Optional, Tuple, Union
+from collections import OrderedDict
+from contextlib import asynccontextmanager
 from PIL import Image, ImageFile
-import base64, io, os, time, uuid, httpx
+import io, os, secrets, threading, time, httpx
+import pybase64 as base64  # base64 SIMD (AVX2/AVX-512), cùng API với stdlib
+
+from .utils_dna import bytes_to_dna, clean_dna, dna_to_bytes, image_to_png_bytes, iter_dna_chunks
 
 # Tăng khả năng chịu ảnh "lỗi nhẹ"
 ImageFile.LOAD_TRUNCATED_IMAGES = True
 
-app = FastAPI(title="Simple DNA Mapping (Action 1)", version="1.0.0", docs_url="/docs", redoc_url="/redoc")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # một httpx.AsyncClient dùng chung: giữ kết nối, không bắt tay TCP/TLS lại mỗi request
+    app.state.http = httpx.AsyncClient(timeout=12)
+    try:
+        yield
+    finally:
+        await app.state.http.aclose()
+
+app = FastAPI(title="Simple DNA Mapping (Action 1)", version="1.0.0", docs_url="/docs", redoc_url="/redoc", lifespan=lifespan)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -19,21 +34,50 @@ app.add_middleware(
 
 MAX_UPLOAD_MB = int(os.getenv("MAX_UPLOAD_MB", "12"))
 JOB_TTL_SEC = int(os.getenv("JOB_TTL_SEC", "900"))  # 15 phút
+MAX_JOBS = int(os.getenv("MAX_JOBS", "256"))  # giới hạn số job giữ trong RAM
 API_KEY = os.getenv("API_KEY")  # nếu đặt, sẽ yêu cầu header x-api-key
+DNA_PREVIEW_LEN = 50  # số nt trả về trong dna_head_50
 
-# In-memory store: { job_id: {created, dna, png_bytes, recon_png_bytes?, meta } }
-JOBS: Dict[str, Dict[str, Any]] = {}
+# In-memory store (FIFO + TTL): { job_id: {created, png_bytes?, recon_png_bytes?, meta } }
+# DNA không lưu lại: tạo lại từ png_bytes và stream theo lát khi tải (rẻ, vì chỉ là tra bảng)
+# Thứ tự tạo: job cũ nhất luôn ở đầu; dọn lười khi thêm job, không quét toàn bộ.
+JOBS: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+_JOBS_LOCK = threading.Lock()
 
 # ---------- tiện ích ----------
 def _enforce_api_key(request: Request):
     if API_KEY and request.headers.get("x-api-key") != API_KEY:
         raise HTTPException(status_code=401, detail="Invalid or missing API key")
 
-def _cleanup_jobs():
+def _job_expired(job: Dict[str, Any], now: float) -> bool:
+    return now - job["created"] > JOB_TTL_SEC
+
+def _evict_jobs(now: float):
+    # gọi khi đang giữ _JOBS_LOCK: bỏ job ở đầu khi quá MAX_JOBS hoặc đã hết hạn
+    while JOBS:
+        job = next(iter(JOBS.values()))
+        if len(JOBS) <= MAX_JOBS and not _job_expired(job, now):
+            break
+        JOBS.popitem(last=False)
+
+def _put_job(job: Dict[str, Any]) -> str:
+    job_id = secrets.token_urlsafe(12)
+    now = time.time()
+    with _JOBS_LOCK:
+        JOBS[job_id] = {"created": now, **job}
+        _evict_jobs(now)
+    return job_id
+
+def _get_job(job_id: str) -> Optional[Dict[str, Any]]:
     now = time.time()
-    expired = [jid for jid, v in JOBS.items() if now - v.get("created", now) > JOB_TTL_SEC]
-    for jid in expired:
-        JOBS.pop(jid, None)
+    with _JOBS_LOCK:
+        job = JOBS.get(job_id)
+        if job is None:
+            return None
+        if _job_expired(job, now):
+            del JOBS[job_id]
+            return None
+        return job
 
 def _decode_b64_any(s: str) -> bytes:
     s = s.strip()
@@ -50,45 +94,35 @@ def _decode_b64_any(s: str) -> bytes:
         except Exception:
             raise HTTPException(status_code=400, detail="Invalid base64 image")
 
-def _image_to_png_bytes(raw: bytes, max_side: int = 256) -> bytes:
+# ---------- pipeline (CPU nặng: chạy trong threadpool, không chặn event loop) ----------
+def _encode_pipeline(raw: bytes, max_side: int, mapping_order: str) -> Tuple[bytes, str]:
+    # chỉ map phần xem trước (4 base/byte -> vài byte đầu); DNA đầy đủ được tạo khi tải
     try:
-        im = Image.open(io.BytesIO(raw)).convert("RGBA")
-    except Exception:
-        raise HTTPException(status_code=400, detail="Invalid image data")
-    if max_side and max(im.size) > max_side:
-        w, h = im.size
-        scale = max_side / max(w, h)
-        im = im.resize((max(1, int(w * scale)), max(1, int(h * scale))), Image.BICUBIC)
-    bio = io.BytesIO()
-    im.save(bio, format="PNG")
-    return bio.getvalue()
-
-def _bytes_to_bits(b: bytes) -> str:
-    return "".join(f"{x:08b}" for x in b)
-
-def _bits_to_bytes(bits: str) -> bytes:
-    bits = "".join(ch for ch in bits if ch in "01")
-    if len(bits) % 8 != 0:
-        bits += "0" * (8 - (len(bits) % 8))
-    return bytes(int(bits[i:i+8], 2) for i in range(0, len(bits), 8))
-
-def _bits_to_dna(bits: str, order: str = "ACGT") -> str:
-    bits = "".join(ch for ch in bits if ch in "01")
-    lut = {"00": order[0], "01": order[1], "10": order[2], "11": order[3]}
-    if len(bits) % 2 != 0:
-        bits += "0"
-    out = []
-    for i in range(0, len(bits), 2):
-        out.append(lut[bits[i:i+2]])
-    return "".join(out)
-
-def _dna_to_bits(dna: str, order: str = "ACGT") -> str:
-    dna = "".join(ch for ch in dna.upper() if ch in "ACGT")
-    rev = {order[0]:"00", order[1]:"01", order[2]:"10", order[3]:"11"}
+        png_bytes = image_to_png_bytes(raw, max_side=max_side)
+        head = bytes_to_dna(png_bytes[:(DNA_PREVIEW_LEN + 3) // 4], order=mapping_order)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return png_bytes, head[:DNA_PREVIEW_LEN].decode("ascii")
+
+def _decode_pipeline(dna_text: Union[str, bytes], mapping_order: str) -> Tuple[bytes, str]:
+    # Clean DNA (ASCII bytes)
+    dna_clean = clean_dna(dna_text)
+    if not dna_clean:
+        raise HTTPException(status_code=400, detail="Invalid DNA text")
+
+    # DNA -> bytes -> ảnh
     try:
-        return "".join(rev[ch] for ch in dna)
-    except KeyError as e:
-        raise HTTPException(status_code=400, detail=f"Invalid base {e}")
+        img_bytes = dna_to_bytes(dna_clean, order=mapping_order)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    # xác thực ảnh PNG
+    try:
+        _ = Image.open(io.BytesIO(img_bytes)).size
+    except Exception:
+        raise HTTPException(status_code=400, detail="Rebuilt bytes are not a valid image")
+
+    png_b64 = base64.b64encode_as_string(img_bytes)
+    return img_bytes, png_b64
 
 # ---------- endpoints ----------
 @app.head("/")
@@ -101,8 +135,10 @@ async def index():
 
 @app.get("/health")
 async def health():
-    _cleanup_jobs()
-    return {"status": "ok", "active_jobs": len(JOBS)}
+    with _JOBS_LOCK:
+        _evict_jobs(time.time())
+        active = len(JOBS)
+    return {"status": "ok", "active_jobs": active}
 
 @app.post("/encode_simple_json")
 async def encode_simple_json(
@@ -114,7 +150,6 @@ async def encode_simple_json(
     Trả về: job_id, 50 nt đầu, độ dài, và URL tải .txt DNA (kèm PNG chuẩn hoá).
     """
     _enforce_api_key(request)
-    _cleanup_jobs()
 
     image_b64 = payload.get("image_b64")
     image_url = payload.get("image_url")
@@ -126,30 +161,24 @@ async def encode_simple_json(
 
     # lấy bytes ảnh
     if image_b64:
-        raw = _decode_b64_any(image_b64)
+        raw = await run_in_threadpool(_decode_b64_any, image_b64)
     else:
         try:
-            async with httpx.AsyncClient(timeout=12) as client:
-                r = await client.get(image_url)
-                r.raise_for_status()
-                raw = r.content
+            r = await request.app.state.http.get(image_url)
+            r.raise_for_status()
+            raw = r.content
         except Exception:
             raise HTTPException(status_code=400, detail="Cannot fetch image_url")
 
     if len(raw) > MAX_UPLOAD_MB * 1024 * 1024:
         raise HTTPException(status_code=413, detail="File too large")
 
-    png_bytes = _image_to_png_bytes(raw, max_side=max_side)
-    bits = _bytes_to_bits(png_bytes)
-    dna = _bits_to_dna(bits, order=mapping_order)
+    png_bytes, dna_head = await run_in_threadpool(_encode_pipeline, raw, max_side, mapping_order)
 
-    job_id = str(uuid.uuid4())
-    JOBS[job_id] = {
-        "created": time.time(),
+    job_id = _put_job({
         "png_bytes": png_bytes,
-        "dna": dna,
         "meta": {"mapping_order": mapping_order, "max_side": max_side}
-    }
+    })
 
     # URL tải file
     dna_url = str(request.url_for("download_dna", job_id=job_id))
@@ -159,8 +188,8 @@ async def encode_simple_json(
         "job_id": job_id,
         "mapping_order": mapping_order,
         "max_side": max_side,
-        "dna_len": len(dna),
-        "dna_head_50": dna[:50],
+        "dna_len": 4 * len(png_bytes),
+        "dna_head_50": dna_head,
         "downloads": {
             "dna_txt": dna_url,
             "normalized_png": image_url_norm
@@ -169,17 +198,22 @@ async def encode_simple_json(
 
 @app.get("/job/{job_id}/dna.txt")
 async def download_dna(job_id: str):
-    job = JOBS.get(job_id)
-    if not job:
+    job = _get_job(job_id)
+    if not job or "png_bytes" not in job:
         raise HTTPException(status_code=404, detail="job not found or expired")
-    return PlainTextResponse(
-        content=job["dna"],
-        headers={"Content-Disposition": "attachment; filename=\"dna.txt\""}
+    png_bytes = job["png_bytes"]
+    return StreamingResponse(
+        iter_dna_chunks(png_bytes, order=job["meta"]["mapping_order"]),
+        media_type="text/plain",
+        headers={
+            "Content-Disposition": "attachment; filename=\"dna.txt\"",
+            "Content-Length": str(4 * len(png_bytes)),
+        }
     )
 
 @app.get("/job/{job_id}/image.png")
 async def download_image(job_id: str):
-    job = JOBS.get(job_id)
+    job = _get_job(job_id)
     if not job:
         raise HTTPException(status_code=404, detail="job not found or expired")
     return Response(
@@ -199,44 +233,30 @@ async def decode_simple_json(
     """
     _enforce_api_key(request)
 
-    dna_text: Optional[str] = payload.get("dna_text")
+    dna_text: Union[str, bytes, None] = payload.get("dna_text")
     dna_url: Optional[str] = payload.get("dna_url")
     mapping_order = payload.get("mapping_order", "ACGT")
 
     if not dna_text and not dna_url:
         raise HTTPException(status_code=400, detail="Provide dna_text or dna_url")
 
-    async def fetch_text(url: str) -> str:
-        async with httpx.AsyncClient(timeout=12) as client:
-            r = await client.get(url)
-            r.raise_for_status()
-            return r.text
+    async def fetch_dna(url: str) -> bytes:
+        # giữ nguyên bytes: DNA là ASCII, không cần giải mã text
+        r = await request.app.state.http.get(url)
+        r.raise_for_status()
+        return r.content
 
     if dna_text is None and dna_url:
         try:
-            dna_text = await fetch_text(dna_url)
+            dna_text = await fetch_dna(dna_url)
         except Exception:
             raise HTTPException(status_code=400, detail="Cannot fetch dna_url")
 
-    # Clean DNA & chuyển về bits
-    dna_clean = "".join(ch for ch in (dna_text or "").upper() if ch in "ACGT")
-    if not dna_clean:
-        raise HTTPException(status_code=400, detail="Invalid DNA text")
-    bits = _dna_to_bits(dna_clean, order=mapping_order)
-
-    # bits -> bytes -> ảnh
-    img_bytes = _bits_to_bytes(bits)
-    # xác thực ảnh PNG
-    try:
-        _ = Image.open(io.BytesIO(img_bytes)).size
-    except Exception:
-        raise HTTPException(status_code=400, detail="Rebuilt bytes are not a valid image")
+    img_bytes, png_b64 = await run_in_threadpool(_decode_pipeline, dna_text or b"", mapping_order)
 
     # Lưu job decode để tải file PNG
-    job_id = str(uuid.uuid4())
-    JOBS[job_id] = {"created": time.time(), "recon_png_bytes": img_bytes, "meta": {"mapping_order": mapping_order}}
+    job_id = _put_job({"recon_png_bytes": img_bytes, "meta": {"mapping_order": mapping_order}})
 
-    png_b64 = base64.b64encode(img_bytes).decode("ascii")
     recon_url = str(request.url_for("download_reconstructed", job_id=job_id))
 
     return {
@@ -247,7 +267,7 @@ async def decode_simple_json(
 
 @app.get("/job/{job_id}/reconstructed.png")
 async def download_reconstructed(job_id: str):
-    job = JOBS.get(job_id)
+    job = _get_job(job_id)
     if not job or "recon_png_bytes" not in job:
         raise HTTPException(status_code=404, detail="reconstructed image not found or expired")
     return Response(
@@ -1 +1,127 @@
-# empty file to mark this directory as a package
+from typing import Iterator, Union
+from PIL import Image
+import functools, io, queue
+import numpy as np
+
+from .utils_dna_fast import NUMBA_AVAILABLE, bytes_to_dna_nb, dna_to_bytes_nb
+
+# ---------- PNG buffer pool ----------
+# Tái sử dụng BytesIO (giữ nguyên dung lượng đã cấp) thay vì tạo mới + giãn buffer mỗi lần lưu PNG.
+# Không truncate(0) (CPython sẽ thu hồi bộ nhớ) và không getvalue() (chia sẻ buffer, lần ghi sau phải copy).
+_BIO_POOL: "queue.LifoQueue[io.BytesIO]" = queue.LifoQueue(maxsize=32)
+_BIO_KEEP_MAX = 2 * 1024 * 1024
+
+def _acquire_bio() -> io.BytesIO:
+    try:
+        bio = _BIO_POOL.get_nowait()
+    except queue.Empty:
+        return io.BytesIO()
+    bio.seek(0)
+    return bio
+
+def _release_bio(bio: io.BytesIO):
+    if bio.seek(0, io.SEEK_END) > _BIO_KEEP_MAX:
+        return
+    try:
+        _BIO_POOL.put_nowait(bio)
+    except queue.Full:
+        pass
+
+def pil_to_png_bytes(im: Image.Image) -> bytes:
+    # PNG chỉ là vỏ chứa bytes để map sang DNA: nén zlib mức 1 là đủ, nhanh hơn nhiều so với mặc định (6)
+    bio = _acquire_bio()
+    try:
+        im.save(bio, format="PNG", compress_level=1, optimize=False)
+        view = bio.getbuffer()
+        try:
+            return view[:bio.tell()].tobytes()
+        finally:
+            view.release()
+    finally:
+        _release_bio(bio)
+
+# ---------- ảnh ----------
+def image_to_png_bytes(raw: bytes, max_side: int = 256) -> bytes:
+    # ảnh bất kỳ -> RGBA, thu nhỏ về cạnh dài <= max_side -> PNG
+    try:
+        im = Image.open(io.BytesIO(raw))
+        if max_side and max(im.size) > max_side:
+            # JPEG: libjpeg giải mã thẳng ở 1/2, 1/4, 1/8 độ phân giải (giữ >= 2x kích thước đích)
+            w, h = im.size
+            scale = 2 * max_side / max(w, h)
+            im.draft("RGB", (max(1, int(w * scale)), max(1, int(h * scale))))
+        im = im.convert("RGBA")
+    except Exception:
+        raise ValueError("Invalid image data")
+    if max_side and max(im.size) > max_side:
+        # thu nhỏ kiểu box trước (reducing_gap) rồi mới lọc lần cuối
+        im.thumbnail((max_side, max_side), Image.BILINEAR, reducing_gap=2.0)
+    return pil_to_png_bytes(im)
+
+# ---------- DNA ----------
+# Bảng tra theo mapping_order, cache LRU có giới hạn (mapping_order do client gửi lên).
+# Mảng trả về là chỉ đọc vì được dùng chung giữa các request.
+_INVALID = 255
+_JIT_MAX_BYTES = 4096  # input nhỏ hơn ngưỡng này: dùng Numba (nếu có), lớn hơn: NumPy
+_NON_ACGT = bytes(c for c in range(256) if c not in b"ACGT")
+
+def _check_order(order: str):
+    # kiểm tra trước khi tra cache (lru_cache cần key hashable); chỉ hoán vị của ACGT mới giải mã lại được
+    if not isinstance(order, str) or sorted(order) != list("ACGT"):
+        raise ValueError("mapping_order must be a permutation of ACGT")
+
+@functools.lru_cache(maxsize=32)
+def _dna_table(order: str) -> np.ndarray:
+    # 256 dòng: byte -> 4 base (mỗi base = 2 bit, MSB trước)
+    bases = np.frombuffer(order.encode("ascii"), dtype=np.uint8)
+    b = np.arange(256, dtype=np.uint8)[:, None]
+    tbl = bases[(b >> np.array([6, 4, 2, 0], dtype=np.uint8)) & 3]
+    tbl.setflags(write=False)
+    return tbl
+
+@functools.lru_cache(maxsize=32)
+def _dna_codes(order: str) -> np.ndarray:
+    # mã ASCII -> giá trị 2 bit (255 = không hợp lệ)
+    lut = np.full(256, _INVALID, dtype=np.uint8)
+    lut[np.frombuffer(order.encode("ascii"), dtype=np.uint8)] = np.arange(4, dtype=np.uint8)
+    lut.setflags(write=False)
+    return lut
+
+def bytes_to_dna(data: bytes, order: str = "ACGT") -> bytes:
+    # bytes -> DNA (ASCII bytes) trực tiếp, không qua chuỗi bits trung gian
+    _check_order(order)
+    tbl = _dna_table(order)
+    if NUMBA_AVAILABLE and len(data) < _JIT_MAX_BYTES:
+        return bytes_to_dna_nb(data, tbl)
+    return tbl[np.frombuffer(data, dtype=np.uint8)].tobytes()
+
+def iter_dna_chunks(data: bytes, order: str = "ACGT", chunk_size: int = 64 * 1024) -> Iterator[bytes]:
+    # DNA (ASCII bytes) theo từng lát chunk_size byte đầu vào, để stream ra client
+    _check_order(order)
+    tbl = _dna_table(order)
+    arr = np.frombuffer(data, dtype=np.uint8)
+    for i in range(0, arr.size, chunk_size):
+        yield tbl[arr[i:i + chunk_size]].tobytes()
+
+def clean_dna(text: Union[str, bytes]) -> bytes:
+    # giữ lại A/C/G/T (không phân biệt hoa thường), bỏ mọi ký tự khác: upper + translate đều chạy ở C
+    if isinstance(text, str):
+        text = text.encode("ascii", "ignore")
+    return text.upper().translate(None, _NON_ACGT)
+
+def dna_to_bytes(dna: bytes, order: str = "ACGT") -> bytes:
+    # DNA (ASCII bytes) -> bytes: tra bảng 2 bit rồi np.packbits (bit lẻ cuối được đệm 0)
+    _check_order(order)
+    lut = _dna_codes(order)
+    if NUMBA_AVAILABLE and len(dna) < 4 * _JIT_MAX_BYTES:
+        out, i = dna_to_bytes_nb(dna, lut)
+        if i >= 0:
+            raise ValueError(f"Invalid base at {i}: {chr(dna[i])}")
+        return out
+    codes = lut[np.frombuffer(dna, dtype=np.uint8)]
+    bad = codes == _INVALID
+    if bad.any():
+        i = int(np.argmax(bad))
+        raise ValueError(f"Invalid base at {i}: {chr(dna[i])}")
+    bits = np.stack([(codes >> 1) & 1, codes & 1], axis=1).ravel()
+    return np.packbits(bits).tobytes()
@@ -0,0 +1,46 @@
+# Đường JIT (Numba, tuỳ chọn) cho input nhỏ: vòng lặp biên dịch sẵn, không tốn overhead
+# tạo mảng trung gian mỗi lần gọi như NumPy. Không cài numba -> NUMBA_AVAILABLE = False.
+import numpy as np
+
+try:
+    from numba import njit
+except ImportError:
+    njit = None
+
+NUMBA_AVAILABLE = njit is not None
+
+if NUMBA_AVAILABLE:
+    @njit(cache=True, boundscheck=False)
+    def _bytes_to_dna_kernel(data, table, out):
+        for i in range(data.shape[0]):
+            b = data[i]
+            for k in range(4):
+                out[4 * i + k] = table[b, k]
+
+    @njit(cache=True, boundscheck=False)
+    def _dna_to_bytes_kernel(dna, codes, out):
+        # trả về vị trí base không hợp lệ đầu tiên, hoặc -1; 2 bit cuối thiếu được đệm 0
+        n = dna.shape[0]
+        for j in range(out.shape[0]):
+            acc = 0
+            for k in range(4):
+                i = 4 * j + k
+                c = 0
+                if i < n:
+                    c = codes[dna[i]]
+                    if c == 255:
+                        return i
+                acc = (acc << 2) | c
+            out[j] = acc
+        return -1
+
+def bytes_to_dna_nb(data: bytes, table: np.ndarray) -> bytes:
+    out = np.empty(4 * len(data), dtype=np.uint8)
+    _bytes_to_dna_kernel(np.frombuffer(data, dtype=np.uint8), table, out)
+    return out.tobytes()
+
+def dna_to_bytes_nb(dna: bytes, codes: np.ndarray):
+    # -> (bytes, vị trí base lỗi hoặc -1)
+    out = np.empty((len(dna) + 3) // 4, dtype=np.uint8)
+    bad = _dna_to_bytes_kernel(np.frombuffer(dna, dtype=np.uint8), codes, out)
+    return out.tobytes(), bad